@@ -3,78 +3,101 @@ class CSVParser:
         # Store the delimiter used to separate fields (default: comma)
         self.delimiter = delimiter
 
-    def parse(self, filepath):
-        # Infer a Python type for a cell value: int -> float -> str (empty -> None)
-        def infer(v):
-            v = v.strip()
-            if v == "":
-                return None
-            for cast in (int, float):
-                try:
-                    return cast(v)
-                except ValueError:
-                    pass
-            return v  # fallback: keep as string
+    def headers(self, filepath):
+        # Read only the header record (column names, whitespace stripped), tokenized like the rows
+        with open(filepath, 'r', encoding='utf-8', newline='') as f:
+            text = f.readline()
+            # A quoted header name may contain a newline: read on until the quotes balance
+            while text.count('"') % 2:
+                line = f.readline()
+                if not line:
+                    break
+                text += line
+        return [h.strip() for h in next(self._records(text), [])]
+
+    # Infer a Python type for a cell value: int -> float -> str (empty -> None)
+    @staticmethod
+    def _infer(v):
+        v = v.strip()
+        if v == "":
+            return None
+        for cast in (int, float):
+            try:
+                return cast(v)
+            except ValueError:
+                pass
+        return v  # fallback: keep as string
 
-        # Minimal CSV tokenizer (no csv module): handles delimiter, quotes, escaped quotes, newlines in quotes
-        def parse_rows(stream, delim):
-            data = stream.read()  # reads entire file; simple and fine for moderate sizes
-            row, field, in_quotes = [], [], False
-            i, n = 0, len(data)
+    def _records(self, data, columns=None):
+        """
+        Minimal CSV tokenizer (no csv module): handles delimiter, quotes, escaped quotes, newlines in quotes
+        - yields each record as a list of field strings, the header record first
+        - columns: header names to build (None = all); other fields of the data
+          records are scanned but come back as ''
+        """
+        delim = self.delimiter
+        wanted = None  # field positions to keep; None while reading the header row
+        row, field, in_quotes = [], [], False
+        keep = True  # whether the current field is materialized
+        i, n = 0, len(data)
 
-            while i < n:
-                ch = data[i]
+        while i < n:
+            ch = data[i]
 
-                if in_quotes:
-                    if ch == '"':
-                        # Handle escaped quote ("") inside quoted field
-                        if i + 1 < n and data[i + 1] == '"':
+            if in_quotes:
+                if ch == '"':
+                    # Handle escaped quote ("") inside quoted field
+                    if i + 1 < n and data[i + 1] == '"':
+                        if keep:
                             field.append('"')
-                            i += 1  # skip the escape char
-                        else:
-                            in_quotes = False  # closing quote
+                        i += 1  # skip the escape char
                     else:
-                        field.append(ch)
-                else:
-                    if ch == '"':
-                        in_quotes = True  # start quoted field
-                    elif ch == delim:
-                        # End of field: push and reset
-                        row.append(''.join(field))
-                        field = []
-                    elif ch == '\n':
-                        # End of record (line): push last field, yield the row, reset
-                        row.append(''.join(field))
-                        field = []
-                        yield row
-                        row = []
-                    elif ch == '\r':
-                        # Ignore CR; CRLF will be finalized by the '\n'
-                        pass
-                    else:
-                        field.append(ch)
+                        in_quotes = False  # closing quote
+                elif keep:
+                    field.append(ch)
+            else:
+                if ch == '"':
+                    in_quotes = True  # start quoted field
+                elif ch == delim:
+                    # End of field: push and reset
+                    row.append(''.join(field) if keep else '')
+                    field = []
+                    keep = wanted is None or len(row) in wanted
+                elif ch == '\n':
+                    # End of record (line): push last field, yield the row, reset
+                    row.append(''.join(field) if keep else '')
+                    field = []
+                    if wanted is None and columns is not None:
+                        # Header done: only the requested fields are built from here on
+                        wanted = {j for j, h in enumerate(row) if h.strip() in columns}
+                    yield row
+                    row = []
+                    keep = wanted is None or 0 in wanted
+                elif ch == '\r':
+                    # Ignore CR; CRLF will be finalized by the '\n'
+                    pass
+                elif keep:
+                    field.append(ch)
 
-                i += 1
+            i += 1
 
-            # Flush final field/row at EOF (if file doesn't end with newline)
-            if field or row:
-                row.append(''.join(field))
-                yield row
+        # Flush final field/row at EOF (if file doesn't end with newline)
+        if field or row:
+            row.append(''.join(field))
+            yield row
 
-        # Open file and stream through our tokenizer
+    def parse(self, filepath, columns=None):
+        # columns: names to materialize (None = all); other fields are scanned but never built or typed
         with open(filepath, 'r', encoding='utf-8', newline='') as f:
-            rows = parse_rows(f, self.delimiter)
+            data = f.read()  # reads entire file; simple and fine for moderate sizes
 
-            # First row is the header; strip whitespace
-            headers = [h.strip() for h in next(rows)]
+        rows = self._records(data, columns)
 
-            # Yield each subsequent row as a dict: header -> inferred value
-            for r in rows:
-                # Align row length to header length (pad or truncate)
-                if len(r) < len(headers):
-                    r += [''] * (len(headers) - len(r))
-                elif len(r) > len(headers):
-                    r = r[:len(headers)]
+        # First row is the header; strip whitespace
+        headers = [h.strip() for h in next(rows, [])]
+        positions = [i for i, h in enumerate(headers) if columns is None or h in columns]
 
-                # Infer types per cell and produce a row dictionary
-                yield dict(zip(headers, (infer(x) for x in r)))
+        # Yield each subsequent row as a dict: header -> inferred value
+        for r in rows:
+            # Missing trailing fields count as empty (NULL), extra fields are ignored
+            yield {headers[i]: self._infer(r[i]) if i < len(r) else None for i in positions}
@@ -21,28 +21,41 @@ class DataLoader:
         )
 
         # Create inspection table linked to restaurants
+        # (sketched columns back the approximate dashboard aggregates;
+        # addresses and other free text only get zone maps and NULL counts)
         self.db.create_table(
             "inspection_info",
             primary_key="Inspection_Info_ID",
-            indexes=["F_Restaurant_Info_ID"]
+            indexes=["F_Restaurant_Info_ID"],
+            sketch_columns=["Score", "Grade", "Business_Name", "F_Restaurant_Info_ID"]
         )
 
         # Create restaurant table with frequently queried indexed fields
         self.db.create_table(
             "restaurant_info",
             primary_key="Restaurant_Info_ID",
-            indexes=["F_Zip_Code_ID", "Restaurant_Name", "Categories"]
+            indexes=["F_Zip_Code_ID", "Restaurant_Name", "Categories"],
+            sketch_columns=["Rating", "Review_Count", "Categories"]
         )
 
-    def load_all(self):
+    def load_all(self, lazy=True):
         # Initialize all required tables
         self.create_tables()
 
-        # Load each CSV file into its corresponding table
-        self.load_csv("data/zip_code.csv", "zip_code")
-        self.load_csv("data/demographics_info.csv", "demographics_info")
-        self.load_csv("data/inspection_info.csv", "inspection_info")
-        self.load_csv("data/restaurant_info.csv", "restaurant_info")
+        # Attach each CSV file to its table (parsed on first access when lazy)
+        load = self.register_csv if lazy else self.load_csv
+        load("data/zip_code.csv", "zip_code")
+        load("data/demographics_info.csv", "demographics_info")
+        load("data/inspection_info.csv", "inspection_info")
+        load("data/restaurant_info.csv", "restaurant_info")
+
+    def register_csv(self, filepath, table_name):
+        # Read only the header now; rows and columns are parsed on demand
+        self.db.register_source(
+            table_name,
+            self.parser.headers(filepath),
+            lambda columns: self.parser.parse(filepath, columns)
+        )
 
     def load_csv(self, filepath, table_name):
         # Parse each row from the CSV file
@@ -17,6 +17,10 @@ def load_db():
 # Initialize database engine
 db = load_db()
 
+# Working memory per query before joins, sorts and aggregations spill to temp files
+# (the engine is shared by every session, so one large query must not take the process down)
+QUERY_MEMORY_BUDGET = 256 * 1024 * 1024
+
 
 # ------------------------ SIDEBAR ------------------------
 with st.sidebar:
@@ -30,9 +34,9 @@ with st.sidebar:
 
     # Display database tables and columns
     st.markdown("### TABLES")
-    for table, meta in db.database.items():
+    for table in db.database:
         with st.expander(f"📂 {table}", expanded=False):
-            for col in meta['rows'][next(iter(meta['rows']))].keys():
+            for col in db.columns(table):
                 # In advanced mode, columns are clickable for query insertion
                 if st.session_state.get("advanced_mode", False):
                     if st.button(f"{col}", key=f"{table}_{col}"):
@@ -78,19 +82,12 @@ if st.session_state.advanced_mode:
     st.info("Click any table/column name on the left to insert it into your query.")
     
     # Default example query shown in advanced editor
-    default_query = '''select_query(
-        from_table="restaurant_info",
-        joins=[("inspection_info", ("Restaurant_Info_ID", "F_Restaurant_Info_ID"), "inner")],
-        where=[
-            [("restaurant_info.Categories", "=", "Mexican")]
-        ],
-        group_by="restaurant_info.Categories",
-        agg_col="inspection_info.Score",
-        agg_fn="avg",
-        columns=["restaurant_info.Categories", "inspection_info.avg_Score"],
-        order_by=["inspection_info.avg_Score", "restaurant_info.Categories"],
-        descending=[True, True]
-    )'''
+    default_query = '''SELECT restaurant_info.Categories, AVG(inspection_info.Score)
+FROM restaurant_info
+JOIN inspection_info ON restaurant_info.Restaurant_Info_ID = inspection_info.F_Restaurant_Info_ID
+WHERE restaurant_info.Categories = 'Mexican'
+GROUP BY restaurant_info.Categories
+ORDER BY AVG(inspection_info.Score) DESC, restaurant_info.Categories DESC'''
     
     # Initialize query input on first load
     if "adv_query_input" not in st.session_state:
@@ -116,12 +113,12 @@ if st.session_state.advanced_mode:
         if st.button("🚀 Run Query"):
             import traceback
             try:
-                # Evaluate the query string safely with limited globals
-                result = eval(st.session_state.adv_query_input, {"select_query": db.select_query})
+                # Parse the SQL text (plans are cached per normalized statement)
+                result = db.execute(st.session_state.adv_query_input, memory_budget=QUERY_MEMORY_BUDGET)
     
                 # Validate returned result
                 if result is None:
-                    st.error("`db.select_query()` returned None.")
+                    st.error("`db.execute()` returned None.")
                     st.stop()
     
                 if not isinstance(result, (list, tuple)):
@@ -173,7 +170,7 @@ with col1:
         with left_key_col:
             left_key = st.selectbox(
                 "Left Key (Join On)", 
-                db.database[from_table]['rows'][next(iter(db.database[from_table]['rows']))].keys(),
+                db.columns(from_table),
                 key="left_key"
             )
     
@@ -185,7 +182,7 @@ with col1:
         with right_key_col:
             right_key = st.selectbox(
                 "Right Key (Join On)", 
-                db.database[join_table]['rows'][next(iter(db.database[join_table]['rows']))].keys(),
+                db.columns(join_table),
                 key="right_key (Join On)"
             )
     
@@ -212,11 +209,9 @@ with col1:
             st.warning("Please select a table first to use WHERE filters.")
         else:
             # Collect columns from main and joined tables
-            all_columns = list(db.database[from_table]['rows']
-                               [next(iter(db.database[from_table]['rows']))].keys())
+            all_columns = db.columns(from_table)
             if enable_join and join_table:
-                all_columns += list(db.database[join_table]['rows']
-                                    [next(iter(db.database[join_table]['rows']))].keys())
+                all_columns += db.columns(join_table)
 
             # Initialize WHERE conditions if empty
             if "where_conditions" not in st.session_state or not st.session_state.where_conditions:
@@ -294,34 +289,34 @@ with col1:
         
         if agg_fn != "None":
             st.markdown("### Agg Column")
-            agg_fields = list(db.database[from_table]['rows'][next(iter(db.database[from_table]['rows']))].keys())
+            agg_fields = db.columns(from_table)
             if enable_join:
-                agg_fields += list(db.database[join_table]['rows'][next(iter(db.database[join_table]['rows']))].keys())
+                agg_fields += db.columns(join_table)
             agg_col = st.selectbox("Agg Column", agg_fields)
 
     # GROUP BY selection
     group_by = None
     if enable_Aggregation:
         st.markdown("### GROUP BY")
-        group_by_fields = list(db.database[from_table]['rows'][next(iter(db.database[from_table]['rows']))].keys())
+        group_by_fields = db.columns(from_table)
         if enable_join:
-            group_by_fields += list(db.database[join_table]['rows'][next(iter(db.database[join_table]['rows']))].keys())
+            group_by_fields += db.columns(join_table)
         group_by = st.selectbox("Group By", ["None"] + group_by_fields, index=0)
 
     # COLUMN selection
     st.markdown("### COLUMNS")
-    all_fields = list(db.database[from_table]['rows'][next(iter(db.database[from_table]['rows']))].keys())
+    all_fields = db.columns(from_table)
     if enable_join:
-        all_fields += list(db.database[join_table]['rows'][next(iter(db.database[join_table]['rows']))].keys())
+        all_fields += db.columns(join_table)
     selected_columns = st.multiselect("Select Columns", options=all_fields, default=all_fields)
 
     # ORDER BY selection
     order_by = None
     if enable_order_by: 
         st.markdown("### ORDER BY")
-        order_cols = list(db.database[from_table]['rows'][next(iter(db.database[from_table]['rows']))].keys())
+        order_cols = db.columns(from_table)
         if enable_join:
-            order_cols += list(db.database[join_table]['rows'][next(iter(db.database[join_table]['rows']))].keys())
+            order_cols += db.columns(join_table)
         order_by = st.multiselect("Order By Columns", order_cols)
         descending_flags = {col: st.checkbox(f"Descending: {col}", key=f"desc_{col}") for col in order_by}
 
@@ -335,7 +330,7 @@ try:
         # Build WHERE structure in engine-compatible format
         where = []
         for i, cond in enumerate(st.session_state.where_conditions):
-            if enable_join and cond['col'] in db.database[join_table]['rows'][next(iter(db.database[join_table]['rows']))].keys():
+            if enable_join and cond['col'] in db.columns(join_table):
                 full_col = f"{join_table}.{cond['col']}"
             else:
                 full_col = f"{from_table}.{cond['col']}"
@@ -352,7 +347,7 @@ try:
         # Prefix GROUP BY and AGGREGATION columns properly
         group_by_prefixed = f"{from_table}.{group_by}" if group_by and group_by != "None" else None
         agg_fn_used = agg_fn if agg_fn != "None" else None
-        agg_source_table = join_table if enable_join and agg_col in db.database[join_table]['rows'][next(iter(db.database[join_table]['rows']))].keys() else from_table
+        agg_source_table = join_table if enable_join and agg_col in db.columns(join_table) else from_table
         agg_col_prefixed = f"{agg_source_table}.{agg_col}" if agg_col else None
     
         # Build SELECT columns list
@@ -362,7 +357,7 @@ try:
         if agg_fn_used:
             select_cols.append(f"{agg_source_table}.{agg_fn_used}_{agg_col}")
         select_cols += [
-            f"{join_table}.{col}" if enable_join and col in db.database[join_table]['rows'][next(iter(db.database[join_table]['rows']))].keys()
+            f"{join_table}.{col}" if enable_join and col in db.columns(join_table)
             else f"{from_table}.{col}"
             for col in selected_columns
             if col != group_by and col != agg_col
@@ -378,10 +373,11 @@ try:
             agg_fn=agg_fn_used,
             columns=select_cols,
             order_by=[
-                f"{agg_source_table}.{col}" if col in db.database[agg_source_table]['rows'][next(iter(db.database[agg_source_table]['rows']))].keys()
+                f"{agg_source_table}.{col}" if col in db.columns(agg_source_table)
                 else f"{from_table}.{col}" for col in order_by
             ] if order_by else None,
-            descending=[descending_flags[col] for col in order_by] if order_by else None
+            descending=[descending_flags[col] for col in order_by] if order_by else None,
+            memory_budget=QUERY_MEMORY_BUDGET
         )
     
         # Display results
@@ -1,5 +1,63 @@
+import sys
+import threading
+
 from csv_parser import CSVParser
 from data_loader import DataLoader
+from sql_parser import SQLParser
+from sketches import ReservoirSample
+from table_stats import TableStats
+from spill import MemoryBudget, SpillBuffer, partition, external_sort
+
+
+# Hash partitions used when an aggregation or a grace hash join spills to disk
+SPILL_PARTITIONS = 16
+
+# Times a grace hash join partition that still doesn't fit is split again
+GRACE_MAX_DEPTH = 3
+
+
+# Percentile aggregates: name -> quantile
+PERCENTILES = {"median": 0.5, "p90": 0.9, "p95": 0.95, "p99": 0.99}
+
+
+def percentile(values, q):
+    # Nearest-rank percentile of a list of numbers
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class _Descending:
+    # Sort key wrapper that inverts the order of the wrapped value
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+# Aggregate functions: name -> fn(values)
+AGG_FUNCTIONS = {
+    "avg": lambda v: round(sum(v)/len(v), 2) if v else None,
+    "sum": sum,
+    "count": len,
+    "max": max,
+    "min": min,
+    "count_distinct": lambda v: len(set(v))
+} | {name: (lambda v, q=q: percentile(v, q)) for name, q in PERCENTILES.items()}
+
+
+def agg_values(agg_fn, vals):
+    # Values an aggregate runs over: COUNT DISTINCT takes any non-NULL value, the rest numbers
+    if agg_fn == "count_distinct":
+        return [v for v in vals if v is not None]
+    return [v for v in vals if isinstance(v, (int, float))]
 
 
 class MyCustomMemoryDB:
@@ -8,20 +66,90 @@ class MyCustomMemoryDB:
         # { table_name: { rows, indexes, primary_key, ... } }
         self.database = {}
 
+        # SQL text front end with its plan cache
+        self.sql_parser = SQLParser(self)
+
         # Console color codes for error highlighting
         self.MessageBGcolourS = "\033[48;2;253;226;224m\033[30m"
         self.MessageBGcolourE = "\033[0m"
 
-    def create_table(self, name, primary_key="id", indexes=None, foreign_keys=None):
+    def create_table(self, name, primary_key="id", indexes=None, foreign_keys=None,
+                     sample_size=1024, sketch_columns=None, block_size=256):
         # Create a new table definition
         self.database[name] = {
             "rows": {},                 # row storage (pk -> row)
             "next_id": 1,               # auto-increment counter
             "primary_key": primary_key,
             "indexes": {col: {} for col in (indexes or [])},
-            "foreign_keys": foreign_keys or {}
+            "foreign_keys": foreign_keys or {},
+            "columns": {},              # column names in first-seen order
+            "source": None,             # lazy loader, see register_source
+            "sample": ReservoirSample(sample_size),
+            "stats": TableStats(block_size, sketch_columns),
+            "ordered_keys": {}          # col -> (sorted keys, key kind), see sorted_keys
         }
 
+    def register_source(self, table_name, columns, load):
+        """
+        Attach a lazy row source to a table:
+        - columns: every column the source can provide (e.g. a CSV header)
+        - load(columns): iterable of row dicts holding just those columns
+        Nothing is read until ensure_loaded asks for it.
+        """
+        table = self.database[table_name]
+        table["columns"] = dict.fromkeys(columns)
+        # The lock serializes loads: one database is shared by every Streamlit session
+        table["source"] = {"load": load, "loaded": set(), "lock": threading.RLock()}
+
+    def ensure_loaded(self, table_name, columns=None):
+        """
+        Materialize a lazily registered table, or just some of its columns:
+        - the first load inserts rows with the requested columns plus the
+          primary key, indexed and foreign key columns
+        - later calls parse only the still-missing columns and merge them
+          into the existing rows by primary key
+        columns=None loads everything. select_query, get_all and select_where
+        call this; the lower-level operators work on whatever is loaded.
+        Loads hold the table's lock, and "loaded" only lists columns once
+        every row carries them, so concurrent readers never see partial rows.
+        """
+        table = self.database[table_name]
+        source = table["source"]
+        if source is None:
+            return
+
+        pk = table["primary_key"]
+        available = set(table["columns"])
+        if columns is None or pk not in available:
+            wanted = available
+        else:
+            wanted = available & set(columns)
+        if source["loaded"] and wanted <= source["loaded"]:
+            return
+
+        with source["lock"]:
+            # Another thread may have loaded these columns while we waited
+            missing = wanted - source["loaded"]
+
+            if not source["loaded"]:
+                keys = {pk, *table["indexes"], *table["foreign_keys"]} & available
+                for row in source["load"](missing | keys):
+                    self.insert(table_name, row)
+                source["loaded"] = missing | keys
+            elif missing:
+                rows_by_pk = table["rows"]
+                loaded = source["loaded"] | missing
+                order = [c for c in table["columns"] if c in loaded]
+                for position, row in enumerate(source["load"](missing | {pk})):
+                    values = {c: row[c] for c in missing}
+                    # Swap in a complete new row (header column order); readers keep the old one
+                    merged = rows_by_pk[row[pk]] | values
+                    rows_by_pk[row[pk]] = {c: merged[c] for c in order if c in merged}
+                    table["stats"].add_columns(position, values)
+                sample = table["sample"]
+                sample.rows = [rows_by_pk[r[pk]] for r in sample.rows]
+                source["loaded"] = loaded
+
     def insert(self, table_name, row):
         # Insert a single row into a table
         table = self.database[table_name]
@@ -34,6 +162,7 @@ class MyCustomMemoryDB:
 
         # Enforce foreign key constraints if defined
         for fk_col, (ref_table, ref_col) in table["foreign_keys"].items():
+            self.ensure_loaded(ref_table, [ref_col])
             if row[fk_col] not in self.database[ref_table]["indexes"].get(ref_col, {}):
                 raise ValueError(
                     f"Foreign key constraint failed: {fk_col}={row[fk_col]} "
@@ -42,8 +171,18 @@ class MyCustomMemoryDB:
 
         # Store row by primary key
         key = row[pk]
+        replaced = key in table["rows"]
         table["rows"][key] = row
 
+        # Track column names so joins can pad without sampling a row
+        for col in row:
+            table["columns"].setdefault(col, None)
+
+        # Keep statistics / zone maps and the reservoir sample current
+        table["ordered_keys"].clear()
+        table["stats"].add(key, row, replaced)
+        table["sample"].add(row)
+
         # Update secondary indexes
         for index_col in table["indexes"]:
             val = row.get(index_col)
@@ -52,60 +191,350 @@ class MyCustomMemoryDB:
 
     def get_all(self, table_name):
         # Return all rows from a table
+        self.ensure_loaded(table_name)
         return list(self.database[table_name]["rows"].values())
 
+    def columns(self, table_name):
+        # Return the column names of a table
+        return list(self.database[table_name]["columns"])
+
+    def is_ordered_on(self, table_name, col):
+        # True if rows can be scanned in col order without sorting the rows
+        table = self.database[table_name]
+        return col == table["primary_key"] or col in table["indexes"]
+
+    def sorted_keys(self, table_name, col):
+        """
+        Sorted PK / index keys of col and their kind, cached until the next insert:
+        - kind is "num" for ints and floats, otherwise the Python type
+        - kind None (and no keys) when kinds are mixed, since they can't be
+          ordered (CSV type inference can give "24" as an int in a text column);
+          "empty" for an empty table
+        """
+        table = self.database[table_name]
+        cached = table["ordered_keys"].get(col)
+        if cached is None:
+            keys = table["rows"] if col == table["primary_key"] else table["indexes"][col]
+            kinds = {"num" if isinstance(k, (int, float)) else type(k) for k in keys}
+            if len(kinds) > 1:
+                cached = (None, None)
+            else:
+                cached = (sorted(keys), kinds.pop() if kinds else "empty")
+            table["ordered_keys"][col] = cached
+        return cached
+
+    def key_kind(self, table_name, col):
+        # Kind of the PK / index keys of col (see sorted_keys)
+        return self.sorted_keys(table_name, col)[1]
+
+    def can_merge_join(self, left_table, left_key, right_table, right_key):
+        # Both keys ordered by PK / index, with one comparable key kind across both sides
+        if not (self.is_ordered_on(left_table, left_key) and self.is_ordered_on(right_table, right_key)):
+            return False
+        kinds = {self.key_kind(left_table, left_key), self.key_kind(right_table, right_key)} - {"empty"}
+        return None not in kinds and len(kinds) <= 1
+
+    def ordered_scan(self, table_name, col):
+        """
+        Yield rows in ascending col order (NULLs last):
+        - primary key / secondary index: walk the cached sorted keys
+        - otherwise: fall back to sorting the rows
+        """
+        table = self.database[table_name]
+        if self.is_ordered_on(table_name, col):
+            for _, rows in self.key_groups(table_name, col):
+                yield from rows
+            return
+        null_last = lambda v: (v is None, v)
+        yield from sorted(table["rows"].values(), key=lambda r: null_last(r.get(col)))
+
+    def key_groups(self, table_name, col, nulls=True):
+        """
+        (value, rows) pairs in ascending order of a PK / indexed col, from the
+        cached sorted keys; rows with a NULL col come last as (None, rows)
+        unless nulls=False.
+        """
+        table = self.database[table_name]
+        rows_by_pk = table["rows"]
+        keys = self.sorted_keys(table_name, col)[0]
+
+        if col == table["primary_key"]:
+            for k in keys:
+                yield k, (rows_by_pk[k],)
+            return
+
+        index = table["indexes"][col]
+        seen = 0
+        for val in keys:
+            pks = index[val]
+            yield val, [rows_by_pk[k] for k in pks]
+            seen += len(pks)
+        # NULLs are never indexed; pick them up only if some are missing
+        if nulls and seen < len(rows_by_pk):
+            yield None, [row for row in rows_by_pk.values() if row.get(col) is None]
+
     def inner_join(self, left_table, right_table, left_key, right_key):
-        # Simple nested-loop INNER JOIN
-        left_rows = self.get_all(left_table)
-        right_rows = self.get_all(right_table)
-        joined = []
-
-        for l in left_rows:
-            for r in right_rows:
-                if l.get(left_key) == r.get(right_key):
-                    joined.append(
-                        {f"{left_table}.{k}": v for k, v in l.items()} |
-                        {f"{right_table}.{k}": v for k, v in r.items()}
-                    )
-        return joined
+        # INNER JOIN of two whole tables (hash probe, see join_pipeline)
+        return self._join_tables(left_table, right_table, left_key, right_key, "inner")
 
     def left_join(self, left_table, right_table, left_key, right_key):
-        # LEFT JOIN implementation
-        left_rows = self.get_all(left_table)
-        right_rows = self.get_all(right_table)
-        joined = []
-
-        for l in left_rows:
-            matched = False
-            for r in right_rows:
-                if l.get(left_key) == r.get(right_key):
-                    joined.append(
-                        {f"{left_table}.{k}": v for k, v in l.items()} |
-                        {f"{right_table}.{k}": v for k, v in r.items()}
-                    )
-                    matched = True
-            if not matched:
-                joined.append(
-                    {f"{left_table}.{k}": v for k, v in l.items()} |
-                    {f"{right_table}.{k}": None for k in right_rows[0].keys()}
-                )
-        return joined
+        # LEFT JOIN of two whole tables; unmatched rows are padded from the column list
+        return self._join_tables(left_table, right_table, left_key, right_key, "left")
+
+    def _join_tables(self, left_table, right_table, left_key, right_key, join_type):
+        self.ensure_loaded(left_table)
+        self.ensure_loaded(right_table)
+        rows = ({f"{left_table}.{k}": v for k, v in r.items()}
+                for r in self.database[left_table]["rows"].values())
+        joins = [(right_table, (f"{left_table}.{left_key}", right_key), join_type)]
+        return list(self.join_pipeline([left_table], joins, rows))
+
+    def merge_join(self, left_table, right_table, left_key, right_key, join_type="inner"):
+        """
+        Sort-merge JOIN over the sorted PK / index keys of both tables:
+        - no hash table over either side, only one key group held at a time
+        - rows are yielded in ascending join key order (NULL keys last)
+        - LEFT JOIN pads from the table's column list
+        NULL keys never match, as in SQL. Callers check can_merge_join first.
+        """
+        right_groups = self.key_groups(right_table, right_key, nulls=False)
+        padding = {f"{right_table}.{k}": None for k in self.columns(right_table)}
+        left_prefix = [(k, f"{left_table}.{k}") for k in self.columns(left_table)]
+        right_prefix = [(k, f"{right_table}.{k}") for k in self.columns(right_table)]
+
+        right_val, right_rows = next(right_groups, (None, None))
+        for left_val, left_rows in self.key_groups(left_table, left_key, nulls=join_type == "left"):
+            # Advance the right side past smaller keys
+            while right_rows is not None and left_val is not None and right_val < left_val:
+                right_val, right_rows = next(right_groups, (None, None))
+
+            matched = right_rows is not None and left_val is not None and right_val == left_val
+            if not matched and join_type != "left":
+                continue
+            for l in left_rows:
+                prefixed = {q: l[k] for k, q in left_prefix if k in l}
+                if matched:
+                    for r in right_rows:
+                        yield prefixed | {q: r[k] for k, q in right_prefix if k in r}
+                else:
+                    yield prefixed | padding
+
+    def resolve_join_key(self, sources, key):
+        # Qualify a join key against the tables already in the pipeline
+        if "." in key and key.split(".", 1)[0] in sources:
+            return key
+        for t in sources:
+            if key in self.database[t]["columns"]:
+                return f"{t}.{key}"
+        return f"{sources[0]}.{key}"
+
+    def hash_table_size(self, table_name, key):
+        # Estimated bytes of a hash table on key: dict slot + list per distinct value, a pointer per row
+        # (an unsketched key is assumed unique, the worst case)
+        stats = self.database[table_name]["stats"]
+        distinct = stats.distinct(key)
+        if distinct is None:
+            distinct = stats.row_count
+        return distinct * (sys.getsizeof([]) + 100) + stats.row_count * 8
+
+    def hash_lookup(self, table_name, key, budget=None):
+        # Build a probe function (key value -> matching rows), reusing PK / index hash tables
+        # (None if a new hash table would not fit the memory budget)
+        table = self.database[table_name]
+        rows_by_pk = table["rows"]
+
+        if key == table["primary_key"]:
+            return lambda v: [rows_by_pk[v]] if v in rows_by_pk else []
+
+        if key in table["indexes"]:
+            index = table["indexes"][key]
+            return lambda v: [rows_by_pk[k] for k in index.get(v, [])]
+
+        if budget is not None and not budget.reserve(self.hash_table_size(table_name, key)):
+            return None
+
+        built = {}
+        for r in rows_by_pk.values():
+            if r.get(key) is not None:
+                built.setdefault(r[key], []).append(r)
+        return lambda v: built.get(v, [])
+
+    def grace_hash_join(self, rows, left_col, right_table, right_key, join_type, budget):
+        """
+        Grace hash JOIN for a build side that does not fit the memory budget:
+        - both sides are hash-partitioned on the join key into SPILL_PARTITIONS
+          temp files each
+        - each partition pair is joined with its own in-memory hash table
+        - a partition whose hash table still doesn't fit is partitioned again
+          (up to GRACE_MAX_DEPTH levels; below that it is built regardless)
+        Rows come out grouped by partition, not in probe order.
+        """
+        padding = {f"{right_table}.{k}": None for k in self.columns(right_table)}
+        budget.spilled = True
+        right_rows = (r for r in self.database[right_table]["rows"].values() if r.get(right_key) is not None)
+        yield from self._grace_partitions(rows, right_rows, left_col, right_table, right_key,
+                                          join_type, budget, padding, depth=1)
+
+    def _grace_partitions(self, left_rows, right_rows, left_col, right_table, right_key,
+                          join_type, budget, padding, depth):
+        right_parts = partition(right_rows, lambda r: r[right_key], SPILL_PARTITIONS, depth)
+        left_parts = partition(left_rows, lambda r: r.get(left_col), SPILL_PARTITIONS, depth)
+        held = 0
+        try:
+            for left_part, right_part in zip(left_parts, right_parts):
+                if not left_part.count or (not right_part.count and join_type != "left"):
+                    continue
+                # Worst case for the partition's hash table: every key distinct
+                size = right_part.count * (sys.getsizeof([]) + 108)
+                if right_part.count > 1 and depth < GRACE_MAX_DEPTH:
+                    if not budget.reserve(size):
+                        yield from self._grace_partitions(left_part, right_part, left_col, right_table, right_key,
+                                                          join_type, budget, padding, depth + 1)
+                        continue
+                    held = size
+                # else: built regardless, splitting further can't help
+
+                built = {}
+                for r in right_part:
+                    built.setdefault(r[right_key], []).append(r)
+                for l in left_part:
+                    matches = built.get(l.get(left_col), [])
+                    for r in matches:
+                        yield l | {f"{right_table}.{k}": v for k, v in r.items()}
+                    if not matches and join_type == "left":
+                        yield l | padding
+                built = None
+                budget.release(held)
+                held = 0
+        finally:
+            budget.release(held)
+            for part in left_parts + right_parts:
+                part.close()
+
+    def join_pipeline(self, sources, joins, rows, budget=None):
+        """
+        Multi-way hash JOIN in a single pass over the probe-side rows:
+        - rows are already qualified with every table in sources
+        - each join probes its table's PK / index (or a hash table built once)
+        - probes are chained per row, so no intermediate result is materialized
+        - left keys may be qualified ("table.col") to join on any earlier table,
+          otherwise the first source table that has the column is used
+        - a hash table that would exceed the memory budget becomes a grace hash join
+        Yields rows with every column qualified by its source table.
+        """
+        sources = list(sources)
+        stages = []
+        for join_table, (lk, rk), jt in joins:
+            left_col, right_col = self.resolve_join_key(sources, lk), rk.split(".")[-1]
+            lookup = self.hash_lookup(join_table, right_col, budget)
+            if lookup is None:
+                # Close the pipeline segment so far and join this table out of core
+                rows = self._probe_stages(rows, stages)
+                rows = self.grace_hash_join(rows, left_col, join_table, right_col, jt, budget)
+                stages = []
+            else:
+                stages.append((
+                    left_col,
+                    join_table,
+                    lookup,
+                    jt,
+                    {f"{join_table}.{k}": None for k in self.columns(join_table)}
+                ))
+            sources.append(join_table)
+
+        yield from self._probe_stages(rows, stages)
+
+    def _probe_stages(self, rows, stages):
+        # Chain each row through the probe stages of a join pipeline
+        def probe(row, depth):
+            if depth == len(stages):
+                yield row
+                return
+            left_col, join_table, lookup, jt, padding = stages[depth]
+            matches = lookup(row.get(left_col))
+            for r in matches:
+                yield from probe(row | {f"{join_table}.{k}": v for k, v in r.items()}, depth + 1)
+            if not matches and jt == "left":
+                yield from probe(row | padding, depth + 1)
+
+        for row in rows:
+            yield from probe(row, 0)
 
     def select_where(self, table_name, where):
+        # WHERE filtering over a fully loaded table
+        self.ensure_loaded(table_name)
+        return self._scan_where(table_name, where)
+
+    def _scan_where(self, table_name, where, lazy=False):
         """
-        WHERE filtering with:
+        WHERE filtering over the loaded rows with:
         - AND / OR logic
-        - index / primary key optimization
+        - index / primary key lookup or zone-map scan, whichever touches fewer rows
+        - AND conditions evaluated most selective first (column statistics)
         - support for prefixed column names
         """
         table = self.database[table_name]
         pk = table["primary_key"]
         indexes = table.get("indexes", {})
         rows_by_pk = table["rows"]
+        stats = table["stats"]
 
         if not where:
             return list(rows_by_pk.values())
 
+        # Order each AND group by estimated selectivity so all() fails fast
+        where = [
+            sorted(
+                [c for c in group if isinstance(c, tuple)],
+                key=lambda c: stats.selectivity(c[0].split(".")[-1], c[1], c[2])
+            )
+            for group in where
+        ]
+
+        # Index / PK candidates (only safe when there is a single AND group, i.e. no OR)
+        candidate_keys = None
+        if len(where) == 1:
+            for col, op, val in where[0]:
+                col = col.split(".")[-1]
+                if val is None:
+                    continue        # IS [NOT] NULL: NULLs are never keyed in the PK / indexes
+                if op == "=" and isinstance(val, str):
+                    continue        # = on strings is case-insensitive, keys are not
+                if op == "=" and col == pk:
+                    keys = [val]
+                elif op == "=" and col in indexes:
+                    keys = indexes[col].get(val, [])
+                elif op == "in" and col in indexes and isinstance(val, (list, tuple, set)):
+                    keys = [k for v in dict.fromkeys(val) for k in indexes[col].get(v, [])]
+                else:
+                    continue
+                if candidate_keys is None or len(keys) < len(candidate_keys):
+                    candidate_keys = keys
+
+        # Zone-map scan: only blocks whose min / max can satisfy the WHERE
+        blocks = None
+        if stats.zones_valid:
+            blocks = [b for b in stats.blocks if stats.block_may_match(b, where)]
+            scan_size = sum(len(b["keys"]) for b in blocks)
+            if candidate_keys is not None and len(candidate_keys) > scan_size:
+                candidate_keys = None
+
+        if candidate_keys is not None:
+            rows = [rows_by_pk[k] for k in candidate_keys if k in rows_by_pk]
+        elif blocks is not None:
+            rows = (rows_by_pk[k] for b in blocks for k in b["keys"])
+        else:
+            rows = rows_by_pk.values()
+        return self.filter_rows(rows, where, lazy)
+
+    def filter_rows(self, rows, where, lazy=False):
+        """
+        Apply WHERE conditions to any iterable of rows:
+        - where is a list of OR groups, each a list of AND-ed (col, op, val)
+        - rows are consumed lazily, only matches are kept
+        - lazy=True returns a generator instead of a list, so a LIMIT can stop
+          the scan early
+        """
         def get_value(row, col):
             # Resolve column value from prefixed or unprefixed keys
             if col in row:
@@ -136,83 +565,218 @@ class MyCustomMemoryDB:
                 return False
             return False
 
-        # Try to narrow candidate rows using PK or index
-        candidate_keys = None
-        first = where[0][0]
-
-        if first[1] == "=":
-            col = first[0].split(".")[-1]
-            if col == pk:
-                candidate_keys = [first[2]]
-            elif col in indexes:
-                candidate_keys = indexes[col].get(first[2], [])
-
-        rows = (
-            [rows_by_pk[k] for k in candidate_keys if k in rows_by_pk]
-            if candidate_keys is not None else
-            list(rows_by_pk.values())
+        groups = [[cond for cond in group if isinstance(cond, tuple)] for group in where]
+        matches = (
+            row for row in rows
+            if any(all(match_row(row, *cond) for cond in group) for group in groups)
         )
+        return matches if lazy else list(matches)
 
-        result = []
-        for row in rows:
-            if all(match_row(row, *cond) for group in where for cond in group if isinstance(cond, tuple)):
-                result.append(row)
+    def group_by(self, rows, group_key, agg_col, agg_fn, budget=None):
+        """
+        GROUP BY with aggregation
+        - with a memory budget, groups that no longer fit switch to partitioned
+          aggregation: (key, value) pairs are hash-partitioned into temp files
+          and each partition is aggregated on its own
+        """
+        from collections import defaultdict
+
+        if agg_fn not in AGG_FUNCTIONS:
+            return []
+
+        table, col = agg_col.split(".", 1)
+        name = f"{table}.{agg_fn}_{col}"
 
+        grouped = defaultdict(list)
+        held = 0
+        rows = iter(rows)
+        for r in rows:
+            key, val = r.get(group_key), r.get(agg_col)
+            if budget is not None:
+                size = sys.getsizeof(val) + (8 if key in grouped else sys.getsizeof([]) + 100)
+                if not budget.reserve(size):
+                    pending = (key, val)
+                    break
+                held += size
+            grouped[key].append(val)
+        else:
+            if budget is not None:
+                budget.release(held)
+            return [
+                {group_key: k, name: AGG_FUNCTIONS[agg_fn](agg_values(agg_fn, vals))}
+                for k, vals in grouped.items()
+            ]
+
+        # Over budget: spill everything seen so far plus the rest, then aggregate per partition
+        from itertools import chain
+        pairs = chain(
+            ((k, v) for k, vals in grouped.items() for v in vals),
+            [pending],
+            ((r.get(group_key), r.get(agg_col)) for r in rows)
+        )
+        parts = partition(pairs, lambda p: p[0], SPILL_PARTITIONS)
+        grouped = None
+        budget.release(held)
+        budget.spilled = True
+
+        result = []
+        for part in parts:
+            grouped = defaultdict(list)
+            for k, v in part:
+                grouped[k].append(v)
+            result.extend(
+                {group_key: k, name: AGG_FUNCTIONS[agg_fn](agg_values(agg_fn, vals))}
+                for k, vals in grouped.items()
+            )
+            part.close()
         return result
 
-    def group_by(self, rows, group_key, agg_col, agg_fn):
-        # GROUP BY with aggregation
+    def approximate_aggregate(self, from_table, joins, where, group_key, agg_col, agg_fn):
+        """
+        Approximate GROUP BY / aggregate, never scanning the full base table:
+        - whole-column COUNT DISTINCT, percentiles, MIN and MAX come from column sketches
+        - COUNT, SUM, AVG and percentiles run on the base table's reservoir sample
+          (joined and filtered as usual); COUNT and SUM are scaled up to the table size
+        - returns None when there is no sound estimate (COUNT DISTINCT, MIN, MAX
+          with joins / WHERE / GROUP BY); the caller then runs the query exactly
+        Each result has a "<agg>_error" column: half-width of a ~95% interval,
+        None where the sample is too small to give one.
+        """
         from collections import defaultdict
+        import math
 
-        funcs = {
-            "avg": lambda v: round(sum(v)/len(v), 2) if v else None,
-            "sum": sum,
-            "count": len,
-            "max": max,
-            "min": min
-        }
-
-        if agg_fn not in funcs:
+        if agg_fn not in AGG_FUNCTIONS:
             return []
 
-        grouped = defaultdict(list)
+        table = self.database[from_table]
+        agg_table, col = agg_col.split(".", 1)
+        name = f"{agg_table}.{agg_fn}_{col}"
+
+        sketch = table["stats"].columns.get(col) if agg_table == from_table else None
+        if sketch and not joins and not where and group_key is None:
+            if agg_fn == "count_distinct":
+                estimate = sketch.distinct.estimate()
+                return [{None: None, name: round(estimate), f"{name}_error": round(1.96 * sketch.distinct.relative_error() * estimate)}]
+            quantiles = sketch.quantiles
+            if agg_fn in ("min", "max"):
+                return [{None: None, name: getattr(quantiles, agg_fn), f"{name}_error": 0}]
+            if agg_fn in PERCENTILES:
+                q, eps = PERCENTILES[agg_fn], quantiles.rank_error()
+                value = quantiles.quantile(q)
+                low, high = quantiles.quantile(q - eps), quantiles.quantile(q + eps)
+                # The rank interval isn't centred on the estimate: cover its wider side
+                error = round(max(value - low, high - value), 2) if quantiles.n else None
+                return [{None: None, name: value, f"{name}_error": error}]
+
+        if agg_fn not in ("count", "sum", "avg") and agg_fn not in PERCENTILES:
+            return None     # a sample can't bound distinct counts or extremes
+
+        # Per group: every sampled value, and per sampled base row its (count, sum)
+        sample = table["sample"]
+        n, N = len(sample.rows), sample.seen
+        values = defaultdict(list)
+        contributions = defaultdict(lambda: defaultdict(lambda: [0, 0]))
+
+        # One pipeline over the whole sample; "#sample" tags each row with its base row
+        base_rows = (
+            {f"{from_table}.{k}": v for k, v in base.items()} | {"#sample": i}
+            for i, base in enumerate(sample.rows)
+        )
+        rows = self.join_pipeline([from_table], joins or [], base_rows)
+        if where:
+            rows = self.filter_rows(rows, where)
         for r in rows:
-            grouped[r.get(group_key)].append(r.get(agg_col))
+            key, v = r.get(group_key), r.get(agg_col)
+            values[key].append(v)
+            if isinstance(v, (int, float)):
+                contributions[key][r["#sample"]][0] += 1
+                contributions[key][r["#sample"]][1] += v
+
+        def standard_error(per_row):
+            # Std error of N * mean(y) under sampling without replacement (zeros included)
+            if n < 2:
+                return None
+            total = sum(per_row)
+            var = (sum(y * y for y in per_row) - total * total / n) / (n - 1)
+            return N * math.sqrt(max(var, 0) * (1 - n / N) / n)
 
-        table, col = agg_col.split(".", 1)
-        return [
-            {
-                group_key: k,
-                f"{table}.{agg_fn}_{col}": funcs[agg_fn]([v for v in vals if isinstance(v, (int, float))])
-            }
-            for k, vals in grouped.items()
-        ]
+        result = []
+        for key, vals in values.items():
+            counts = [c for c, _ in contributions[key].values()]
+            sums = [y for _, y in contributions[key].values()]
+            count, total = sum(counts), sum(sums)
+
+            value = error = None
+            if agg_fn in ("count", "sum"):
+                per_row = counts if agg_fn == "count" else sums
+                estimate = N * sum(per_row) / n
+                error = self._interval(standard_error(per_row))
+                value = round(estimate) if agg_fn == "count" else round(estimate, 2)
+            elif agg_fn == "avg" and count:
+                # Ratio estimator, linearized variance on the residuals y - avg * c
+                avg = total / count
+                se = standard_error([y - avg * c for c, y in contributions[key].values()])
+                error = self._interval(se * n / (N * count) if se is not None else None)
+                value = round(avg, 2)
+            elif agg_fn in PERCENTILES:
+                # Order-statistic interval: the sample rank of the true quantile is ~Binomial(m, q)
+                vals = sorted(agg_values(agg_fn, vals))
+                m, q = len(vals), PERCENTILES[agg_fn]
+                value = percentile(vals, q)
+                spread = 1.96 * math.sqrt(m * q * (1 - q))
+                lo, hi = math.floor(q * m - spread), math.ceil(q * m + spread)
+                if m >= 2 and lo >= 0 and hi <= m - 1:
+                    # Not centred on the estimate: cover its wider side. A rank interval
+                    # running off either end of the sample has no bound (error stays None)
+                    error = round(max(value - vals[lo], vals[hi] - value), 2)
+
+            result.append({group_key: key, name: value, f"{name}_error": error})
+        return result
+
+    def _interval(self, se):
+        # Half-width of a ~95% normal interval
+        return round(1.96 * se, 2) if se is not None else None
 
     def project_columns(self, rows, select):
         # SELECT specific columns
-        result = []
-        for row in rows:
-            new_row = {}
-            for col in select:
-                if col in row:
-                    new_row[col] = row[col]
-                else:
-                    short = col.split(".")[-1]
-                    new_row[col] = next((v for k, v in row.items() if k.endswith(short)), None)
-            result.append(new_row)
-        return result
+        return [self._project_row(row, select) for row in rows]
 
-    def order_by_rows(self, rows, order_by, descending=False):
-        # ORDER BY sorting
+    def _project_row(self, row, select):
+        new_row = {}
+        for col in select:
+            if col in row:
+                new_row[col] = row[col]
+            else:
+                short = col.split(".")[-1]
+                new_row[col] = next((v for k, v in row.items() if k.endswith(short)), None)
+        return new_row
+
+    def order_by_rows(self, rows, order_by, descending=False, budget=None):
+        # ORDER BY sorting (external merge sort when a memory budget is given)
         if isinstance(order_by, str):
             order_by = [order_by]
         if isinstance(descending, bool):
             descending = [descending] * len(order_by)
 
+        if budget is not None:
+            def sort_key(r):
+                # Same order as the stable per-column sorts below: NULLs last ascending
+                keys = ((r.get(col) is None, r.get(col)) for col in order_by)
+                return tuple(_Descending(k) if desc else k for k, desc in zip(keys, descending))
+            return external_sort(rows, sort_key, budget)
+
         for col, desc in reversed(list(zip(order_by, descending))):
             rows.sort(key=lambda r: (r.get(col) is None, r.get(col)), reverse=desc)
         return rows
 
+    def _is_sorted_by(self, sorted_on, order_by, descending=False):
+        # True if ORDER BY asks for a single ascending column the rows already follow
+        if isinstance(order_by, str):
+            order_by = [order_by]
+        if isinstance(descending, bool):
+            descending = [descending]
+        return len(order_by) == 1 and order_by[0] in sorted_on and not any(descending or [])
+
     def reorder_conditions(self, conditions):
         # Normalize WHERE conditions order
         result = []
@@ -226,6 +790,29 @@ class MyCustomMemoryDB:
             result.append(conds + ops)
         return result
 
+    def _referenced_columns(self, from_table, joins=None, where=None, group_by=None,
+                            agg_col=None, columns=None, order_by=None):
+        # Map each table in the query to the columns it must provide (None = all)
+        tables = [from_table] + [j[0] for j in joins or []]
+        if not columns and not agg_col:
+            return {t: None for t in tables}
+
+        names = list(columns or [])
+        for _, (lk, rk), _ in joins or []:
+            names += [lk, rk]
+        for group in where or []:
+            names += [cond[0] for cond in group if isinstance(cond, tuple)]
+        names += [group_by, agg_col]
+        names += [order_by] if isinstance(order_by, str) else list(order_by or [])
+
+        needed = {t: set() for t in tables}
+        for name in filter(None, names):
+            table, _, col = name.rpartition(".")
+            for t in ([table] if table in needed else tables):
+                if col in self.database[t]["columns"]:
+                    needed[t].add(col)
+        return needed
+
     def _check_validate(self, from_table, joins=None, where=None,
                         columns=None, agg_fn=None, agg_col=None, order_by=None):
         # Validate table and column references before execution
@@ -238,8 +825,10 @@ class MyCustomMemoryDB:
 
     def select_query(self, from_table, joins=None, where=None,
                      group_by=None, agg_col=None, agg_fn=None,
-                     columns=None, order_by=None, descending=False):
+                     columns=None, order_by=None, descending=False, limit=None,
+                     approximate=False, memory_budget=None):
         # Main query execution pipeline
+        # (memory_budget: bytes of working memory before operators spill to temp files)
 
         if where:
             where = self.reorder_conditions(where)
@@ -247,47 +836,105 @@ class MyCustomMemoryDB:
         if not self._check_validate(from_table, joins, where, columns, agg_fn, agg_col, order_by):
             return []
 
-        # Load base table
-        rows = [
-            {f"{from_table}.{k}": v for k, v in r.items()}
-            for r in self.database[from_table]["rows"].values()
-        ]
-        base = from_table
-
-        # Apply joins
-        if joins:
-            for join_table, (lk, rk), jt in joins:
-                rows = (
-                    self.inner_join(base, join_table, lk, rk)
-                    if jt == "inner" else
-                    self.left_join(base, join_table, lk, rk)
-                )
-                base = "tmpTable"
-                self.create_table(base)
-                for i, r in enumerate(rows):
-                    self.insert(base, {"id": i + 1, **r})
-
-        # Apply WHERE
-        if where:
-            rows = self.select_where(base, where)
-
-        # Apply GROUP BY
-        if agg_fn and agg_col:
-            rows = self.group_by(rows, group_by, agg_col, agg_fn)
+        # Materialize only the columns this query touches
+        for table_name, cols in self._referenced_columns(from_table, joins, where, group_by,
+                                                         agg_col, columns, order_by).items():
+            self.ensure_loaded(table_name, cols)
+
+        sorted_on = set()   # qualified columns the rows are already ordered by
+        budget = MemoryBudget(memory_budget) if memory_budget else None
+
+        # Approximate aggregates skip the full scan (sketches / reservoir sample)
+        rows = None
+        if approximate and agg_fn and agg_col:
+            rows = self.approximate_aggregate(from_table, joins, where, group_by, agg_col, agg_fn)
+
+            # Return the error bound next to the aggregate it belongs to
+            table, col = agg_col.split(".", 1)
+            name = f"{table}.{agg_fn}_{col}"
+            if columns and name in columns and f"{name}_error" not in columns:
+                i = columns.index(name) + 1
+                columns = columns[:i] + [f"{name}_error"] + columns[i:]
+
+        if rows is None:
+            # Load base table (narrowed by its PK / index when there are no joins)
+            base_rows = (
+                self._scan_where(from_table, where, lazy=True)
+                if where and not joins else
+                self.database[from_table]["rows"].values()
+            )
+            rows = ({f"{from_table}.{k}": v for k, v in r.items()} for r in base_rows)
+            sources = [from_table]
+
+            # Apply joins
+            if joins:
+                join_table, (lk, rk), jt = joins[0]
+                lk = self.resolve_join_key(sources, lk).split(".", 1)[1]
+                rk = rk.split(".")[-1]
+                merge_order = {f"{from_table}.{lk}"} | ({f"{join_table}.{rk}"} if jt == "inner" else set())
+                if (order_by and not agg_fn and self._is_sorted_by(merge_order, order_by, descending)
+                        and self.can_merge_join(from_table, lk, join_table, rk)):
+                    # ORDER BY wants the join key order: a merge join produces it and skips
+                    # the sort (the hash probe is at least as fast when no order is needed)
+                    rows = self.merge_join(from_table, join_table, lk, rk, jt)
+                    sources.append(join_table)
+                    sorted_on = merge_order
+                    joins = joins[1:]
+                rows = self.join_pipeline(sources, joins, rows, budget)
+
+                # Apply WHERE
+                if where:
+                    rows = self.filter_rows(rows, where, lazy=True)
+
+            # LIMIT with nothing left to aggregate or sort: stop the pipeline early
+            if (limit is not None and not agg_fn and not group_by
+                    and (not order_by or (not budget and self._is_sorted_by(sorted_on, order_by, descending)))):
+                from itertools import islice
+                rows = islice(rows, limit)
+
+            rows = SpillBuffer(budget, rows) if budget else list(rows)
+
+            # Apply GROUP BY
+            if agg_fn and agg_col:
+                rows = self.group_by(rows, group_by, agg_col, agg_fn, budget)
+                sorted_on = set()
+                if approximate:
+                    # No estimate was possible, so the answer is exact
+                    rows = [r | {f"{name}_error": 0} for r in rows]
+            elif group_by:
+                # No aggregate: one row per distinct group value, in first-seen order
+                rows = [{group_by: k} for k in dict.fromkeys(r.get(group_by) for r in rows)]
 
         # Apply SELECT
         if columns:
-            rows = self.project_columns(rows, columns)
-
-        # Apply ORDER BY
-        if order_by:
-            rows = self.order_by_rows(rows, order_by, descending)
-
-        # Cleanup temp table
-        self.database.pop("tmpTable", None)
+            rows = (
+                SpillBuffer(budget, (self._project_row(r, columns) for r in rows))
+                if budget else
+                self.project_columns(rows, columns)
+            )
+
+        # Apply ORDER BY (free when a merge join already produced this order)
+        if budget and budget.spilled:
+            sorted_on = set()   # grace partitions don't keep the merge order
+        if order_by and not self._is_sorted_by(sorted_on, order_by, descending):
+            rows = self.order_by_rows(rows, order_by, descending, budget)
+
+        # Apply LIMIT
+        if budget:
+            from itertools import islice
+            it = iter(rows)
+            rows = list(islice(it, limit))
+            if hasattr(it, "close"):
+                it.close()      # LIMIT stopped early: release spill files now
+        elif limit is not None:
+            rows = rows[:limit]
 
         return rows
 
+    def execute(self, sql, params=None, approximate=False, memory_budget=None):
+        # Run a SQL statement (e.g. "SELECT ... WHERE Score < ?") via the cached plans
+        return self.sql_parser.execute(sql, params, approximate, memory_budget)
+
 
 def MyCustomMiniSQLEngine():
     # Factory method to build and populate the database
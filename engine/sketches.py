@@ -0,0 +1,154 @@
+import math
+import random
+
+
+def _hash64(value):
+    # Spread Python's hash (identity for small ints) over 64 bits (splitmix64 finalizer)
+    x = hash(value) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return x ^ (x >> 31)
+
+
+class ReservoirSample:
+    # Uniform sample of a fixed number of rows, maintained one insert at a time (Algorithm R)
+    def __init__(self, capacity=1024, seed=None):
+        self.capacity = capacity
+        self.rows = []
+        self.seen = 0
+        self.random = random.Random(seed)
+
+    def add(self, row):
+        self.seen += 1
+        if len(self.rows) < self.capacity:
+            self.rows.append(row)
+        else:
+            slot = self.random.randrange(self.seen)
+            if slot < self.capacity:
+                self.rows[slot] = row
+
+
+class HyperLogLog:
+    # Count-distinct sketch: 2^precision one-byte registers, ~1.04 / sqrt(m) relative error
+    def __init__(self, precision=12):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(self.m)
+        self._estimate = None      # cached until a register changes
+
+    def add(self, value):
+        x = _hash64(value)
+        idx = x >> (64 - self.precision)
+        rest = x & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+            self._estimate = None
+
+    def estimate(self):
+        if self._estimate is None:
+            self._estimate = self._compute_estimate()
+        return self._estimate
+
+    def _compute_estimate(self):
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+
+        # Small-range correction: linear counting while registers are still empty
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            return m * math.log(m / zeros)
+        return raw
+
+    def relative_error(self):
+        return 1.04 / math.sqrt(self.m)
+
+
+class QuantileSketch:
+    """
+    KLL quantile sketch:
+    - a stack of compactors, level h items each stand for 2^h inserted values
+    - a full compactor is sorted and every other item is promoted a level up
+    - roughly 1.7 / k normalized rank error, in O(k) memory
+    Exact min / max are tracked on the side.
+    """
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.compactors = []
+        self.n = 0
+        self.size = 0
+        self.max_size = 0
+        self.min = self.max = None
+        self.random = random.Random(seed)
+        self._grow()
+
+    def _capacity(self, level):
+        depth = len(self.compactors) - level - 1
+        return int(math.ceil(self.k * (2 / 3) ** depth)) + 1
+
+    def _grow(self):
+        self.compactors.append([])
+        self.max_size = sum(self._capacity(h) for h in range(len(self.compactors)))
+
+    def add(self, value):
+        self.n += 1
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+        self.compactors[0].append(value)
+        self.size += 1
+        if self.size >= self.max_size:
+            self._compress()
+
+    def _compress(self):
+        for h in range(len(self.compactors)):
+            if len(self.compactors[h]) >= self._capacity(h):
+                if h + 1 >= len(self.compactors):
+                    self._grow()
+                items = sorted(self.compactors[h])
+                # Keep an odd leftover at this level so no weight is lost
+                self.compactors[h] = [items.pop()] if len(items) % 2 else []
+                self.compactors[h + 1].extend(items[self.random.randint(0, 1)::2])
+                self.size = sum(len(c) for c in self.compactors)
+                if self.size < self.max_size:
+                    break
+
+    def quantile(self, q):
+        # Approximate value at normalized rank q (0.0 .. 1.0)
+        if not self.n:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        weighted = sorted(
+            (v, 1 << h) for h, items in enumerate(self.compactors) for v in items
+        )
+        total = sum(w for _, w in weighted)
+        target, seen = q * total, 0
+        for v, w in weighted:
+            seen += w
+            if seen >= target:
+                return v
+        return self.max
+
+    def rank_error(self):
+        return 1.7 / self.k
+
+
+class ColumnSketch:
+    # Per-column sketches kept up to date by insert: distinct count and numeric quantiles
+    def __init__(self):
+        self.distinct = HyperLogLog()
+        self.quantiles = QuantileSketch()
+
+    def add(self, value):
+        if value is None:
+            return
+        self.distinct.add(value)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            self.quantiles.add(value)
@@ -0,0 +1,192 @@
+import heapq
+import pickle
+import sys
+import tempfile
+
+
+def row_size(row):
+    # Rough in-memory footprint of a row dict (keys are shared strings, not counted)
+    return sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row.values())
+
+
+class RowSizer:
+    # Cheap row_size: measures every sample_every-th row and charges the running average
+    def __init__(self, sample_every=32):
+        self.sample_every = sample_every
+        self.count = 0
+        self.measured = 0
+        self.total = 0
+
+    def __call__(self, row):
+        if self.count % self.sample_every == 0:
+            self.total += row_size(row)
+            self.measured += 1
+        self.count += 1
+        return self.total // self.measured
+
+
+class MemoryBudget:
+    # Per-query memory accounting: operators reserve bytes and spill when refused
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.spilled = False        # set once any operator went to disk
+
+    def reserve(self, nbytes):
+        # Account for nbytes; False (and nothing reserved) if that would exceed the limit
+        if self.used + nbytes > self.limit:
+            return False
+        self.used += nbytes
+        return True
+
+    def release(self, nbytes):
+        self.used = max(self.used - nbytes, 0)
+
+    def available(self):
+        return max(self.limit - self.used, 0)
+
+
+class SpillFile:
+    # Anonymous temp file of pickled row batches, read back in write order
+    # (the file is only created by the first non-empty write)
+    def __init__(self):
+        self.file = None
+        self.count = 0
+
+    def write(self, rows):
+        if rows:
+            if self.file is None:
+                self.file = tempfile.TemporaryFile()
+            pickle.dump(rows, self.file, pickle.HIGHEST_PROTOCOL)
+            self.count += len(rows)
+
+    def __iter__(self):
+        if self.file is None:
+            return
+        self.file.seek(0)
+        while True:
+            try:
+                batch = pickle.load(self.file)
+            except EOFError:
+                break
+            yield from batch
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+class SpillBuffer:
+    """
+    Row buffer for intermediate results:
+    - rows stay in memory while the budget allows
+    - when a reservation fails, the buffered rows are flushed to a temp file
+    Iteration is one-shot: rows come back in insertion order, each row's
+    memory is released as it is handed out, and the file is closed at the
+    end (or when the iterator is closed early).
+    """
+
+    def __init__(self, budget, rows=()):
+        self.budget = budget
+        self.rows = []
+        self.bytes = 0
+        self.spill = None
+        self.sizer = RowSizer()
+        for row in rows:
+            self.append(row)
+
+    def append(self, row):
+        size = self.sizer(row)
+        if not self.budget.reserve(size):
+            self.flush()
+            if not self.budget.reserve(size):
+                # Not even this one row fits: it goes straight to disk
+                self.spill.write([row])
+                return
+        self.rows.append(row)
+        self.bytes += size
+
+    def flush(self):
+        # Move the in-memory rows to disk
+        if self.spill is None:
+            self.spill = SpillFile()
+            self.budget.spilled = True
+        self.spill.write(self.rows)
+        self.budget.release(self.bytes)
+        self.rows, self.bytes = [], 0
+
+    def __iter__(self):
+        try:
+            if self.spill is not None:
+                yield from self.spill
+            rows, self.rows = self.rows, []
+            per_row = self.bytes / len(rows) if rows else 0
+            for i in range(len(rows)):
+                row, rows[i] = rows[i], None
+                self.bytes -= per_row
+                self.budget.release(per_row)
+                yield row
+        finally:
+            self.close()
+
+    def close(self):
+        self.budget.release(self.bytes)
+        self.rows, self.bytes = [], 0
+        if self.spill is not None:
+            self.spill.close()
+            self.spill = None
+
+
+def partition(rows, key, partitions, seed=0):
+    # Hash-partition rows into temp files by key(row); returns the spill files
+    # (a different seed splits the rows of one partition again)
+    files = [SpillFile() for _ in range(partitions)]
+    batches = [[] for _ in range(partitions)]
+    for row in rows:
+        i = hash((seed, key(row)) if seed else key(row)) % partitions
+        batches[i].append(row)
+        if len(batches[i]) >= 256:
+            files[i].write(batches[i])
+            batches[i] = []
+    for f, batch in zip(files, batches):
+        f.write(batch)
+    return files
+
+
+def external_sort(rows, sort_key, budget):
+    """
+    External merge sort:
+    - fill a run while the budget allows, sort it and write it to a temp file
+    - k-way merge the sorted runs (ties keep input order, like list.sort)
+    Falls back to a plain in-memory sort when everything fits.
+    """
+    runs, run, run_bytes = [], [], 0
+    sizer = RowSizer()
+    for row in rows:
+        size = sizer(row)
+        if not budget.reserve(size):
+            run.sort(key=sort_key)
+            spill = SpillFile()
+            spill.write(run)
+            runs.append(spill)
+            budget.release(run_bytes)
+            budget.spilled = True
+            run, run_bytes = [], 0
+            if not budget.reserve(size):
+                size = 0    # a run holds at least one row; only count what was reserved
+        run.append(row)
+        run_bytes += size
+
+    run.sort(key=sort_key)
+    if not runs:
+        budget.release(run_bytes)
+        return run
+
+    def merged():
+        try:
+            yield from heapq.merge(*runs, run, key=sort_key)
+        finally:
+            budget.release(run_bytes)
+            for spill in runs:
+                spill.close()
+    return merged()
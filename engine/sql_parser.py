@@ -0,0 +1,387 @@
+import re
+import threading
+from collections import OrderedDict
+
+
+# Token patterns, tried in order at each position
+_TOKEN = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<num>-?(?:\d+\.\d*|\.\d+|\d+))
+  | '(?P<str>(?:[^']|'')*)'
+  | "(?P<quoted>[^"]+)"
+  | (?P<op><>|!=|<=|>=|=|<|>)
+  | (?P<punct>[(),*?;])
+  | (?P<name>[A-Za-z_][A-Za-z0-9_.]*)
+""", re.VERBOSE)
+
+KEYWORDS = {
+    "SELECT", "FROM", "WHERE", "AND", "OR", "NOT", "IN", "BETWEEN", "IS", "NULL",
+    "JOIN", "INNER", "LEFT", "OUTER", "ON", "GROUP", "ORDER", "BY", "ASC", "DESC",
+    "LIMIT", "DISTINCT"
+}
+
+# Aggregate functions understood by MyCustomMemoryDB.group_by
+AGGREGATES = {"avg", "sum", "count", "max", "min", "count_distinct", "median", "p90", "p95", "p99"}
+
+# Marks a "?" supplied by the caller (as opposed to a literal lifted out of the text)
+_ARG = object()
+
+
+class _Param:
+    # Placeholder for the n-th parameter of a cached plan
+    def __init__(self, index):
+        self.index = index
+
+
+class _TokenStream:
+    # Cursor over normalized tokens with the usual peek / accept / expect helpers
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self, offset=0):
+        i = self.pos + offset
+        return self.tokens[i] if i < len(self.tokens) else ("eof", None)
+
+    def accept(self, kind, value=None):
+        tok = self.peek()
+        if tok[0] == kind and (value is None or tok[1] == value):
+            self.pos += 1
+            return tok
+        return None
+
+    def expect(self, kind, value=None):
+        tok = self.accept(kind, value)
+        if tok is None:
+            found = self.peek()[1] or "end of query"
+            raise ValueError(f"SQL syntax error: expected {value or kind}, found {found!r}")
+        return tok
+
+
+class SQLParser:
+    """
+    SQL-subset front end for MyCustomMemoryDB.select_query:
+    - SELECT cols | AGG(col) | * FROM t [INNER | LEFT] JOIN t2 ON a = b ...
+    - WHERE with AND / OR / parentheses, =, !=, <, >, <=, >=, IN, BETWEEN, IS NULL
+    - GROUP BY col (without an aggregate: one row per distinct col value),
+      ORDER BY col [ASC | DESC], LIMIT n
+    - aggregates AVG, SUM, COUNT, COUNT(*), COUNT(DISTINCT col), MIN, MAX,
+      MEDIAN, P90, P95, P99; COUNT(*) counts the FROM table's primary key
+    - numeric literals may be negative; no arithmetic, aliases or subqueries
+    Literals are lifted out into parameters, so statements that differ only in
+    their constants share one cached plan; "?" placeholders take caller params.
+    """
+
+    def __init__(self, db, cache_size=128):
+        # Database whose schema is used to qualify column names
+        self.db = db
+        self.cache_size = cache_size
+        # Raw statement text -> (normalized key, tokens, parameter slots)
+        self.statement_cache = OrderedDict()
+        # Normalized key -> select_query keyword arguments with _Param markers
+        self.plan_cache = OrderedDict()
+        # Guards both caches: one parser serves every Streamlit session
+        self.cache_lock = threading.Lock()
+
+    def execute(self, sql, params=None, approximate=False, memory_budget=None):
+        # Run a statement, skipping tokenizing / parsing / planning when cached
+        key, tokens, slots = self._cached(self.statement_cache, sql, lambda: self.normalize(sql))
+        plan = self._cached(self.plan_cache, key, lambda: self.plan(tokens))
+
+        params = list(params or [])
+        values = []
+        for slot in slots:
+            if slot is _ARG:
+                if not params:
+                    raise ValueError("Not enough parameters for '?' placeholders")
+                slot = params.pop(0)
+            values.append(slot)
+        if params:
+            raise ValueError("Too many parameters for '?' placeholders")
+
+        query = self._bind(plan, values)
+        limit = query["limit"]
+        if limit is not None and (not isinstance(limit, int) or isinstance(limit, bool) or limit < 0):
+            raise ValueError(f"LIMIT must be a non-negative integer, got {limit!r}")
+        return self.db.select_query(**query, approximate=approximate, memory_budget=memory_budget)
+
+    def _cached(self, cache, key, build):
+        # Small LRU lookup shared by both caches (built outside the lock; a race just builds twice)
+        with self.cache_lock:
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+        value = build()
+        with self.cache_lock:
+            cache[key] = value
+            cache.move_to_end(key)
+            if len(cache) > self.cache_size:
+                cache.popitem(last=False)
+        return value
+
+    def _bind(self, value, values):
+        # Replace _Param markers in a plan with concrete values
+        if isinstance(value, _Param):
+            return values[value.index]
+        if isinstance(value, dict):
+            return {k: self._bind(v, values) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._bind(v, values) for v in value]
+        if isinstance(value, tuple):
+            return tuple(self._bind(v, values) for v in value)
+        return value
+
+    def tokenize(self, sql):
+        # Split SQL text into (kind, value) tokens
+        tokens, pos = [], 0
+        while pos < len(sql):
+            m = _TOKEN.match(sql, pos)
+            if not m:
+                raise ValueError(f"SQL syntax error: unexpected {sql[pos]!r} at position {pos}")
+            pos = m.end()
+            kind = m.lastgroup
+
+            if kind == "space":
+                continue
+            if kind == "num":
+                text = m.group("num")
+                tokens.append(("num", float(text) if "." in text else int(text)))
+            elif kind == "str":
+                tokens.append(("str", m.group("str").replace("''", "'")))
+            elif kind == "quoted":
+                tokens.append(("name", m.group("quoted")))
+            elif kind == "name" and m.group("name").upper() in KEYWORDS:
+                tokens.append(("kw", m.group("name").upper()))
+            else:
+                tokens.append((kind, m.group(kind)))
+        return tokens
+
+    def normalize(self, sql):
+        """
+        Lift literals and "?" placeholders out of the token stream:
+        - key: canonical statement text with every value replaced by "?"
+        - tokens: the stream with values replaced by ("param", n)
+        - slots: literal values, or _ARG where the caller supplies one
+        """
+        key, tokens, slots = [], [], []
+        for kind, value in self.tokenize(sql):
+            if kind in ("num", "str") or (kind, value) == ("punct", "?"):
+                tokens.append(("param", len(slots)))
+                slots.append(_ARG if kind == "punct" else value)
+                key.append("?")
+            elif (kind, value) != ("punct", ";"):
+                tokens.append((kind, value))
+                key.append(f'"{value}"' if kind == "name" else value)
+        return " ".join(key), tokens, slots
+
+    def plan(self, tokens):
+        # Parse normalized tokens into select_query keyword arguments
+        stream = _TokenStream(tokens)
+        stream.expect("kw", "SELECT")
+        items = self._select_list(stream)
+
+        stream.expect("kw", "FROM")
+        from_table = self._table(stream)
+        tables, joins = [from_table], []
+        while stream.peek()[0] == "kw" and stream.peek()[1] in ("JOIN", "INNER", "LEFT"):
+            joins.append(self._join(stream, tables))
+
+        where = None
+        if stream.accept("kw", "WHERE"):
+            where = [
+                [(self._column(col, tables), op, val) for col, op, val in group]
+                for group in self._or_expr(stream)
+            ]
+
+        group_by = None
+        if stream.accept("kw", "GROUP"):
+            stream.expect("kw", "BY")
+            group_by = self._column(stream.expect("name")[1], tables)
+
+        order = []
+        if stream.accept("kw", "ORDER"):
+            stream.expect("kw", "BY")
+            order.append(self._order_item(stream))
+            while stream.accept("punct", ","):
+                order.append(self._order_item(stream))
+
+        limit = None
+        if stream.accept("kw", "LIMIT"):
+            limit = _Param(stream.expect("param")[1])
+
+        if stream.peek()[0] != "eof":
+            raise ValueError(f"SQL syntax error: unexpected {stream.peek()[1]!r}")
+
+        # Resolve SELECT items to the column names rows will carry
+        aggregates = [item for item in items if isinstance(item, tuple)]
+        if len(aggregates) > 1:
+            raise ValueError("Only one aggregate per query is supported")
+        def aggregate_column(item):
+            # COUNT(*) counts rows through the FROM table's primary key, which is never NULL
+            if item[1] == "*":
+                return f"{from_table}.{self.db.database[from_table]['primary_key']}"
+            return self._column(item[1], tables)
+
+        agg_fn = agg_col = None
+        if aggregates:
+            agg_fn, agg_col = aggregates[0][0], aggregate_column(aggregates[0])
+
+        def output_name(item):
+            if isinstance(item, tuple):
+                table, col = aggregate_column(item).split(".", 1)
+                return f"{table}.{item[0]}_{col}"
+            col = self._column(item, tables)
+            if (agg_fn or group_by) and col != group_by:
+                raise ValueError(f"Column {col} must appear in GROUP BY")
+            return col
+
+        if items == ["*"] and group_by:
+            raise ValueError("SELECT * cannot be combined with GROUP BY")
+        columns = None if items == ["*"] else [output_name(item) for item in items]
+
+        order_by = [output_name(item) for item, _ in order] or None
+        if order_by and columns:
+            for col in order_by:
+                if col not in columns:
+                    raise ValueError(f"ORDER BY column {col} must appear in SELECT")
+
+        return {
+            "from_table": from_table,
+            "joins": joins or None,
+            "where": where,
+            "group_by": group_by,
+            "agg_col": agg_col,
+            "agg_fn": agg_fn,
+            "columns": columns,
+            "order_by": order_by,
+            "descending": [desc for _, desc in order] if order else False,
+            "limit": limit
+        }
+
+    def _select_list(self, stream):
+        # SELECT * | item {, item}; aggregates come back as (fn, col) tuples
+        if stream.accept("punct", "*"):
+            return ["*"]
+        items = [self._select_item(stream)]
+        while stream.accept("punct", ","):
+            items.append(self._select_item(stream))
+        return items
+
+    def _select_item(self, stream):
+        if stream.peek()[0] == "name" and stream.peek(1) == ("punct", "("):
+            return self._aggregate(stream)
+        return stream.expect("name")[1]
+
+    def _aggregate(self, stream):
+        # AGG(col), COUNT(*) or COUNT(DISTINCT col), also accepted in ORDER BY
+        fn = stream.expect("name")[1].lower()
+        stream.expect("punct", "(")
+        if fn == "count" and stream.accept("kw", "DISTINCT"):
+            fn = "count_distinct"
+        if fn not in AGGREGATES:
+            raise ValueError(f"Unsupported aggregate function: {fn.upper()}")
+        if fn == "count" and stream.accept("punct", "*"):
+            col = "*"
+        else:
+            col = stream.expect("name")[1]
+        stream.expect("punct", ")")
+        return (fn, col)
+
+    def _table(self, stream):
+        name = stream.expect("name")[1]
+        if name not in self.db.database:
+            raise ValueError(f"Table not found: {name}")
+        return name
+
+    def _join(self, stream, tables):
+        # [INNER | LEFT [OUTER]] JOIN t ON a = b -> (t, (left_key, right_key), type)
+        join_type = "left" if stream.accept("kw", "LEFT") else "inner"
+        if join_type == "left":
+            stream.accept("kw", "OUTER")
+        else:
+            stream.accept("kw", "INNER")
+        stream.expect("kw", "JOIN")
+        join_table = self._table(stream)
+        stream.expect("kw", "ON")
+        a = self._column(stream.expect("name")[1], tables + [join_table])
+        stream.expect("op", "=")
+        b = self._column(stream.expect("name")[1], tables + [join_table])
+
+        # The key belonging to the joined table is the right key
+        if a.startswith(join_table + "."):
+            a, b = b, a
+        if not b.startswith(join_table + ".") or a.startswith(join_table + "."):
+            raise ValueError(f"JOIN condition must compare {join_table} with an earlier table")
+        tables.append(join_table)
+        return (join_table, (a, b.split(".", 1)[1]), join_type)
+
+    def _column(self, name, tables):
+        # Qualify a column name against the tables in scope
+        if "." in name:
+            table, col = name.split(".", 1)
+            if table in tables and col in self.db.columns(table):
+                return name
+            raise ValueError(f"Column not found: {name}")
+        found = [t for t in tables if name in self.db.columns(t)]
+        if not found:
+            raise ValueError(f"Column not found: {name}")
+        if len(found) > 1:
+            raise ValueError(f"Ambiguous column {name}: qualify it with one of {', '.join(found)}")
+        return f"{found[0]}.{name}"
+
+    def _order_item(self, stream):
+        if stream.peek()[0] == "name" and stream.peek(1) == ("punct", "("):
+            item = self._aggregate(stream)
+        else:
+            item = stream.expect("name")[1]
+        desc = bool(stream.accept("kw", "DESC"))
+        if not desc:
+            stream.accept("kw", "ASC")
+        return item, desc
+
+    def _or_expr(self, stream):
+        # WHERE expressions come back in OR-of-ANDs form: [[(col, op, val), ...], ...]
+        groups = self._and_expr(stream)
+        while stream.accept("kw", "OR"):
+            groups = groups + self._and_expr(stream)
+        return groups
+
+    def _and_expr(self, stream):
+        groups = self._predicate(stream)
+        while stream.accept("kw", "AND"):
+            right = self._predicate(stream)
+            groups = [g + r for g in groups for r in right]
+        return groups
+
+    def _predicate(self, stream):
+        if stream.accept("punct", "("):
+            groups = self._or_expr(stream)
+            stream.expect("punct", ")")
+            return groups
+
+        col = stream.expect("name")[1]
+
+        if stream.accept("kw", "IS"):
+            op = "!=" if stream.accept("kw", "NOT") else "="
+            stream.expect("kw", "NULL")
+            return [[(col, op, None)]]
+
+        if stream.accept("kw", "BETWEEN"):
+            low = _Param(stream.expect("param")[1])
+            stream.expect("kw", "AND")
+            high = _Param(stream.expect("param")[1])
+            return [[(col, ">=", low), (col, "<=", high)]]
+
+        negate = bool(stream.accept("kw", "NOT"))
+        if stream.accept("kw", "IN"):
+            stream.expect("punct", "(")
+            values = [_Param(stream.expect("param")[1])]
+            while stream.accept("punct", ","):
+                values.append(_Param(stream.expect("param")[1]))
+            stream.expect("punct", ")")
+            return [[(col, "not in" if negate else "in", tuple(values))]]
+        if negate:
+            raise ValueError("SQL syntax error: NOT is only supported as NOT IN / IS NOT NULL")
+
+        op = stream.expect("op")[1]
+        return [[(col, "!=" if op == "<>" else op, _Param(stream.expect("param")[1]))]]
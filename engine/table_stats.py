@@ -0,0 +1,166 @@
+from bisect import bisect_right
+
+from sketches import ColumnSketch
+
+
+def _zone_value(value):
+    # Zone maps compare strings case-insensitively, like the WHERE evaluator
+    return value.lower() if isinstance(value, str) else value
+
+
+class TableStats:
+    """
+    Per-table statistics, collected row by row as the table is loaded:
+    - row count and NULL count per column
+    - distinct estimate (HyperLogLog) and histogram (KLL quantiles) for the
+      sketch_columns (None = every column)
+    - zone maps: min / max per column for each block of block_size rows
+    Zone maps let scans skip blocks that cannot match; the rest feeds
+    selectivity estimates for ordering predicates and choosing access paths.
+    """
+
+    def __init__(self, block_size=256, sketch_columns=None):
+        self.block_size = block_size
+        self.sketch_columns = set(sketch_columns) if sketch_columns is not None else None
+        self.row_count = 0
+        self.null_counts = {}
+        self.columns = {}           # col -> ColumnSketch
+        self.histograms = {}        # col -> (values seen, bucket bounds), see histogram
+        self.blocks = []            # [{"keys": [pk, ...], "zones": {col: [min, max] | None}}]
+        self.zones_valid = True     # cleared if a row is replaced in place
+
+    def add(self, key, row, replaced=False):
+        # Account for one inserted row
+        if replaced:
+            # The old row's block no longer describes it; stop trusting zone maps.
+            # Sketches and NULL counts keep describing the old row: they can't
+            # subtract it, and counting the new one too would skew the estimates
+            self.zones_valid = False
+            return
+        self.row_count += 1
+
+        if not self.blocks or len(self.blocks[-1]["keys"]) >= self.block_size:
+            self.blocks.append({"keys": [], "zones": {}})
+        block = self.blocks[-1]
+        block["keys"].append(key)
+        self._add_values(block, row)
+
+    def add_columns(self, position, values):
+        # Account for columns loaded after their row (position = insertion order)
+        block = self.blocks[position // self.block_size] if self.zones_valid else None
+        self._add_values(block, values)
+
+    def _add_values(self, block, row):
+        for col, value in row.items():
+            if value is None:
+                self.null_counts[col] = self.null_counts.get(col, 0) + 1
+                continue
+            sketch = self.columns.get(col)
+            if sketch is None and (self.sketch_columns is None or col in self.sketch_columns):
+                sketch = self.columns[col] = ColumnSketch()
+            if sketch is not None:
+                sketch.add(value)
+            if block is None:
+                continue
+
+            value = _zone_value(value)
+            zone = block["zones"].get(col, [value, value])
+            if zone is not None:
+                try:
+                    zone = [min(zone[0], value), max(zone[1], value)]
+                except TypeError:
+                    zone = None     # mixed types: the block can't be pruned on this column
+            block["zones"][col] = zone
+
+    def distinct(self, col):
+        # Estimated number of distinct non-NULL values (None if col is not sketched)
+        sketch = self.columns.get(col)
+        return round(sketch.distinct.estimate()) if sketch else None
+
+    def histogram(self, col, buckets=10):
+        # Equi-depth bucket boundaries for a numeric column (buckets + 1 values),
+        # rebuilt only after the column has seen new values
+        sketch = self.columns.get(col)
+        if not sketch or not sketch.quantiles.n:
+            return []
+        quantiles = sketch.quantiles
+        cached = self.histograms.get(col)
+        if cached is None or cached[0] != quantiles.n:
+            cached = self.histograms[col] = (
+                quantiles.n, [quantiles.quantile(i / buckets) for i in range(buckets + 1)]
+            )
+        return cached[1]
+
+    def fraction_below(self, col, val):
+        # Estimated fraction of non-NULL values <= val, interpolating within a histogram bucket
+        bounds = self.histogram(col)
+        if not bounds:
+            return None
+        if val < bounds[0]:
+            return 0.0
+        if val >= bounds[-1]:
+            return 1.0
+        i = bisect_right(bounds, val)
+        low, high = bounds[i - 1], bounds[i]
+        within = (val - low) / (high - low) if high > low else 1.0
+        return (i - 1 + within) / (len(bounds) - 1)
+
+    def selectivity(self, col, op, val):
+        # Estimated fraction of rows satisfying (col op val)
+        if not self.row_count:
+            return 1.0
+        nulls = self.null_counts.get(col, 0) / self.row_count
+        if val is None:
+            return nulls if op == "=" else 1 - nulls
+
+        # Unsketched columns fall back to textbook defaults: 1/10 for =, 1/3 for ranges
+        distinct = self.distinct(col)
+        distinct = max(distinct, 1) if distinct is not None else 10
+
+        if op in ("=", "in"):
+            hits = len(val) if op == "in" and isinstance(val, (list, tuple, set)) else 1
+            fraction = min(hits / distinct, 1.0)
+        elif op in ("!=", "not in"):
+            hits = len(val) if op == "not in" and isinstance(val, (list, tuple, set)) else 1
+            fraction = 1 - min(hits / distinct, 1.0)
+        else:
+            below = self.fraction_below(col, val) if isinstance(val, (int, float)) else None
+            if below is None:
+                fraction = 1 / 3
+            else:
+                fraction = below if op in ("<", "<=") else 1 - below
+        return fraction * (1 - nulls)
+
+    def block_may_match(self, block, where):
+        # False only if no OR group can be satisfied by any row in the block
+        return any(
+            all(self._zone_may_match(block, cond) for cond in group if isinstance(cond, tuple))
+            for group in where
+        )
+
+    def _zone_may_match(self, block, cond):
+        col, op, val = cond
+        col = col.split(".")[-1]
+        if val is None or op in ("!=", "not in"):
+            return True
+        if col not in block["zones"]:
+            return False                # every value in the block is NULL
+        zone = block["zones"][col]
+        if zone is None:
+            return True
+
+        low, high = zone
+        try:
+            if op == "in":
+                if not isinstance(val, (list, tuple, set)) or None in val:
+                    return True
+                return any(low <= _zone_value(v) <= high for v in val)
+            val = _zone_value(val)
+            if op == "=":  return low <= val <= high
+            if op == ">":  return high > val
+            if op == "<":  return low < val
+            if op == ">=": return high >= val
+            if op == "<=": return low <= val
+        except TypeError:
+            pass
+        return True